@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from networkx import MultiDiGraph
 from pyformlang.finite_automaton import (
     DeterministicFiniteAutomaton,
@@ -19,11 +21,25 @@ def generate_min_dfa_by_regex(regex: Union[Regex, str]) -> DeterministicFiniteAu
         regex(Union[Regex, str]): Regex or string representation of regex
 
     Returns:
-        Generated deterministic automata
+        Generated deterministic automata. Automata for string regexes are
+        memoized, so a copy of the memoized automata is returned
+    """
+    if type(regex) is str:
+        return _generate_min_dfa_by_regex_str(regex).copy()
+    return regex.to_epsilon_nfa().minimize()
+
+
+@lru_cache(maxsize=1024)
+def _generate_min_dfa_by_regex_str(regex: str) -> DeterministicFiniteAutomaton:
+    """Generate min DFA by string representation of regex, memoized by regex
+
+    Args:
+        regex(str): String representation of regex
+
+    Returns:
+        Generated deterministic automata, must not be modified
     """
-    regex = PythonRegex(regex) if type(regex) is str else regex
-    dfa = regex.to_epsilon_nfa()
-    return dfa.minimize()
+    return PythonRegex(regex).to_epsilon_nfa().minimize()
 
 
 def graph_to_epsilon_nfa(
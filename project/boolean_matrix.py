@@ -1,13 +1,31 @@
-from collections import defaultdict
-from typing import Dict, Set, Any, List
+from array import array
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from functools import cached_property, reduce
+from typing import Dict, Set, Any, List, Iterator
 
+import numpy as np
 from pyformlang.finite_automaton import State, EpsilonNFA
-from scipy.sparse import dok_matrix, bmat, csr_matrix, lil_array, vstack, kron
+from scipy.sparse import (
+    coo_matrix,
+    csr_matrix,
+    hstack,
+    identity,
+    kron,
+    vstack,
+)
+from scipy.sparse.csgraph import breadth_first_order, connected_components
 
 from project.rsm import RSM
 
 __all__ = ["BooleanMatrix"]
 
+# Sync bfs keeps front dense and visited cells bit-packed up to this number of
+# cells in front products with all labels
+_DENSE_FRONT_MAX_CELLS = 1 << 24
+# Transitive closure of larger condensations is found by bfs instead of bitsets
+_BITSET_CLOSURE_MAX_COMPS = 1 << 12
+
 
 class BooleanMatrix:
     """Class representing boolean adjacency matrices of NFA
@@ -16,7 +34,7 @@ class BooleanMatrix:
         state_to_index(Dict[State, int]): Dictionary of states to indices in boolean matrix
         start_states(Set[State]): NFA start states
         final_states(Set[State]): NFA final states
-        bool_matrices(Dict[Any, dok_matrix]): Mapping each edge label to boolean adjacency matrix
+        bool_matrices(Dict[Any, csr_matrix]): Mapping each edge label to boolean adjacency matrix
     """
 
     def __init__(
@@ -24,12 +42,14 @@ class BooleanMatrix:
         state_to_index: Dict[State, int],
         start_states: Set[State],
         final_states: Set[State],
-        bool_matrices: Dict[Any, dok_matrix],
+        bool_matrices: Dict[Any, csr_matrix],
     ):
         self.state_to_index = state_to_index
         self.start_states = start_states
         self.final_states = final_states
         self.bool_matrices = bool_matrices
+        self._start_mask = self._states_mask(start_states)
+        self._final_mask = self._states_mask(final_states)
 
     def __and__(self, other: "BooleanMatrix") -> "BooleanMatrix":
         """Intersection of two automatons represented by boolean matrices
@@ -40,27 +60,21 @@ class BooleanMatrix:
         """
         inter_labels = self.bool_matrices.keys() & other.bool_matrices.keys()
         inter_bool_matrices = {
-            label: kron(self.bool_matrices[label], other.bool_matrices[label])
+            label: kron(
+                self.bool_matrices[label], other.bool_matrices[label], format="csr"
+            )
             for label in inter_labels
+            if self.bool_matrices[label].nnz and other.bool_matrices[label].nnz
+        }
+        inter_states_indices = _ProductStateToIndex(self, other)
+        inter_start_states = {
+            inter_states_indices.state(idx)
+            for idx in np.flatnonzero(np.kron(self._start_mask, other._start_mask))
+        }
+        inter_final_states = {
+            inter_states_indices.state(idx)
+            for idx in np.flatnonzero(np.kron(self._final_mask, other._final_mask))
         }
-        inter_states_indices = dict()
-        inter_start_states = set()
-        inter_final_states = set()
-        for self_state, self_idx in self.state_to_index.items():
-            for other_state, other_idx in other.state_to_index.items():
-                state = State((self_state.value, other_state.value))
-                idx = self_idx * len(other.state_to_index) + other_idx
-                inter_states_indices[state] = idx
-                if (
-                    self_state in self.start_states
-                    and other_state in other.start_states
-                ):
-                    inter_start_states.add(state)
-                if (
-                    self_state in self.final_states
-                    and other_state in other.final_states
-                ):
-                    inter_final_states.add(state)
         return BooleanMatrix(
             inter_states_indices,
             inter_start_states,
@@ -75,12 +89,15 @@ class BooleanMatrix:
             Converted NFA
         """
         nfa = EpsilonNFA()
+        idx_to_state = {idx: state for state, idx in self.state_to_index.items()}
         for label, matrix in self.bool_matrices.items():
-            matrix_as_array = dok_matrix.toarray()
-            for state_from, i in self.state_to_index.items():
-                for state_to, j in self.state_to_index.items():
-                    if matrix_as_array[i][j]:
-                        nfa.add_transitions([(state_from, label, state_to)])
+            coo = matrix.tocoo()
+            nfa.add_transitions(
+                [
+                    (idx_to_state[i], label, idx_to_state[j])
+                    for i, j in zip(coo.row.tolist(), coo.col.tolist())
+                ]
+            )
 
         for state in self.start_states:
             nfa.add_start_state(state)
@@ -89,33 +106,183 @@ class BooleanMatrix:
 
         return nfa
 
+    @cached_property
+    def _states(self) -> np.ndarray:
+        """States placed at their indices in boolean matrix
+
+        Returns:
+            Array of states
+        """
+        states = np.empty(len(self.state_to_index), dtype=object)
+        for state, idx in self.state_to_index.items():
+            states[idx] = state
+        return states
+
+    def _states_mask(self, states: Set[State]) -> np.ndarray:
+        """Boolean mask of given states over state indices
+
+        Args:
+            states(Set[State]): States to be marked
+
+        Returns:
+            Boolean array where index of each given state is set
+        """
+        mask = np.zeros(len(self.state_to_index), dtype=bool)
+        mask[[self.state_to_index[state] for state in states]] = True
+        return mask
+
     def get_start_states(self) -> Set[State]:
         return self.start_states.copy()
 
     def get_final_states(self) -> Set[State]:
         return self.final_states.copy()
 
-    def get_transitive_closure(self) -> dok_matrix:
+    def get_start_mask(self) -> np.ndarray:
+        """Boolean mask of start states over state indices
+
+        Returns:
+            Boolean array where index of each start state is set
+        """
+        return self._start_mask.copy()
+
+    def get_final_mask(self) -> np.ndarray:
+        """Boolean mask of final states over state indices
+
+        Returns:
+            Boolean array where index of each final state is set
+        """
+        return self._final_mask.copy()
+
+    def remove_self_loops(self) -> None:
+        """Removes self loops from boolean matrices of all labels
+
+        Diagonal entries are zeroed in stored data and then eliminated,
+        so sparsity structure is not changed by assignment. Matrices are
+        copied first, as they may be shared with other holders.
+        """
+        for label, matrix in self.bool_matrices.items():
+            matrix = csr_matrix(matrix, dtype=bool, copy=True)
+            rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+            matrix.data[matrix.indices == rows] = False
+            matrix.eliminate_zeros()
+            self.bool_matrices[label] = matrix
+
+    def get_transitive_closure(self) -> csr_matrix:
         """Calculates transitive closure
 
+        Strongly connected components are collapsed first, so reachability is
+        propagated only over the condensation DAG in reverse topological order.
+
         Returns:
-            Transitive closure represented by sparse matrix
+            Transitive closure represented by boolean sparse matrix
         """
-        transitive_closure = sum(
+        states_num = len(self.state_to_index)
+        adjacency = reduce(
+            lambda union, matrix: union.maximum(csr_matrix(matrix, dtype=bool)),
             self.bool_matrices.values(),
-            start=dok_matrix((len(self.state_to_index), len(self.state_to_index))),
+            csr_matrix((states_num, states_num), dtype=bool),
+        )
+        if not adjacency.nnz:
+            return adjacency
+
+        comps_num, labels = connected_components(
+            adjacency, directed=True, connection="strong"
         )
-        cur_nnz = transitive_closure.nnz
-        prev_nnz = None
+        if comps_num == 1:
+            return csr_matrix(np.ones((states_num, states_num), dtype=bool))
+
+        adjacency = adjacency.tocoo()
+        comps_from, comps_to = labels[adjacency.row], labels[adjacency.col]
+        cyclic = np.zeros(comps_num, dtype=bool)
+        cyclic[comps_from[comps_from == comps_to]] = True
+        inter_comps = comps_from != comps_to
+        condensation = coo_matrix(
+            (
+                np.ones(np.count_nonzero(inter_comps), dtype=bool),
+                (comps_from[inter_comps], comps_to[inter_comps]),
+            ),
+            shape=(comps_num, comps_num),
+        ).tocsr()
 
-        if not cur_nnz:
-            return transitive_closure
+        if comps_num > _BITSET_CLOSURE_MAX_COMPS:
+            comps_closure = self._bfs_closure(condensation, cyclic)
+        else:
+            comps_closure = self._bitset_closure(condensation, cyclic)
+        return comps_closure[labels][:, labels]
 
-        while prev_nnz != cur_nnz:
-            transitive_closure += transitive_closure @ transitive_closure
-            prev_nnz, cur_nnz = cur_nnz, transitive_closure.nnz
+    @classmethod
+    def _bitset_closure(cls, dag: csr_matrix, cyclic: np.ndarray) -> csr_matrix:
+        """Transitive closure of condensation DAG with reachability rows as bitsets
 
-        return transitive_closure
+        Args:
+            dag(csr_matrix): Adjacency matrix of condensation DAG
+            cyclic(np.ndarray): Mask of components reachable from themselves
+
+        Returns:
+            Transitive closure represented by boolean sparse matrix
+        """
+        comps_num = dag.shape[0]
+        words = np.uint64(1) << (np.arange(comps_num, dtype=np.uint64) & np.uint64(63))
+        reachable = np.zeros((comps_num, (comps_num + 63) // 64), dtype=np.uint64)
+        for comp in reversed(cls._topological_order(dag)):
+            if cyclic[comp]:
+                reachable[comp, comp >> 6] |= words[comp]
+            for succ in dag.indices[dag.indptr[comp] : dag.indptr[comp + 1]]:
+                reachable[comp] |= reachable[succ]
+                reachable[comp, succ >> 6] |= words[succ]
+
+        return csr_matrix(
+            np.unpackbits(
+                reachable.astype("<u8").view(np.uint8), axis=1, bitorder="little"
+            )[:, :comps_num].astype(bool)
+        )
+
+    @staticmethod
+    def _bfs_closure(dag: csr_matrix, cyclic: np.ndarray) -> csr_matrix:
+        """Transitive closure of condensation DAG by bfs from each component
+
+        Args:
+            dag(csr_matrix): Adjacency matrix of condensation DAG
+            cyclic(np.ndarray): Mask of components reachable from themselves
+
+        Returns:
+            Transitive closure represented by boolean sparse matrix
+        """
+        comps_num = dag.shape[0]
+        rows, cols = [], []
+        for comp in range(comps_num):
+            reached = breadth_first_order(dag, comp, return_predecessors=False)
+            if not cyclic[comp]:
+                reached = reached[1:]
+            rows.append(np.full(len(reached), comp, dtype=np.int32))
+            cols.append(reached)
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        return coo_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)),
+            shape=(comps_num, comps_num),
+        ).tocsr()
+
+    @staticmethod
+    def _topological_order(dag: csr_matrix) -> List[int]:
+        """Topological order of directed acyclic graph by Kahn's algorithm
+
+        Args:
+            dag(csr_matrix): Adjacency matrix of directed acyclic graph
+
+        Returns:
+            List of vertices in topological order
+        """
+        in_degree = np.bincount(dag.indices, minlength=dag.shape[0])
+        queue = deque(np.flatnonzero(in_degree == 0).tolist())
+        order = []
+        while queue:
+            vertex = queue.popleft()
+            order.append(vertex)
+            for succ in dag.indices[dag.indptr[vertex] : dag.indptr[vertex + 1]]:
+                in_degree[succ] -= 1
+                if not in_degree[succ]:
+                    queue.append(succ)
+        return order
 
     @classmethod
     def from_nfa(cls, nfa: EpsilonNFA) -> "BooleanMatrix":
@@ -157,17 +324,18 @@ class BooleanMatrix:
                     final_states.add(state)
         states = sorted(states, key=lambda s: s.value)
         state_to_idx = {s: i for i, s in enumerate(states)}
-        b_mtx = defaultdict(lambda: dok_matrix((len(states), len(states)), dtype=bool))
+        rows, cols = defaultdict(lambda: array("i")), defaultdict(lambda: array("i"))
         for nonterm, dfa in rsm.boxes.items():
-            for state_from, transitions in dfa.to_dict().items():
-                for label, states_to in transitions.items():
-                    mtx = b_mtx[label.value]
-                    states_to = states_to if isinstance(states_to, set) else {states_to}
-                    for state_to in states_to:
-                        mtx[
-                            state_to_idx[State((nonterm, state_from.value))],
-                            state_to_idx[State((nonterm, state_to.value))],
-                        ] = True
+            for state_from, label, state_to in dfa:
+                rows[label.value].append(
+                    state_to_idx[State((nonterm, state_from.value))]
+                )
+                cols[label.value].append(state_to_idx[State((nonterm, state_to.value))])
+        b_mtx = defaultdict(lambda: csr_matrix((len(states), len(states)), dtype=bool))
+        for label in rows:
+            b_mtx[label] = cls._bool_matrix_from_indices(
+                rows[label], cols[label], len(states)
+            )
         return cls(
             state_to_idx,
             start_states,
@@ -178,7 +346,7 @@ class BooleanMatrix:
     @staticmethod
     def _create_boolean_matrix_from_nfa(
         nfa: EpsilonNFA, state_to_index: Dict[State, int]
-    ) -> Dict[Any, dok_matrix]:
+    ) -> Dict[Any, csr_matrix]:
         """Creating mapping from labels to adj boolean matrix
 
         Args:
@@ -187,44 +355,91 @@ class BooleanMatrix:
         Returns:
             Mapping from states to indexes in boolean matrix
         """
+        states_num = len(nfa.states)
         boolean_matrices = defaultdict(
-            lambda: dok_matrix((len(nfa.states), len(nfa.states)), dtype=bool)
+            lambda: csr_matrix((states_num, states_num), dtype=bool)
         )
-        state_from_to_transition = nfa.to_dict()
+        rows = {label: array("i") for label in nfa.symbols}
+        cols = {label: array("i") for label in nfa.symbols}
+        for state_from, label, state_to in nfa:
+            if label in rows:
+                rows[label].append(state_to_index[state_from])
+                cols[label].append(state_to_index[state_to])
         for label in nfa.symbols:
-            dok_mtx = dok_matrix((len(nfa.states), len(nfa.states)), dtype=bool)
-            for state_from, transitions in state_from_to_transition.items():
-                states_to = transitions.get(label, set())
-                if not isinstance(states_to, set):
-                    states_to = {states_to}
-                for state_to in states_to:
-                    dok_mtx[state_to_index[state_from], state_to_index[state_to]] = True
-            boolean_matrices[label] = dok_mtx
+            boolean_matrices[label] = BooleanMatrix._bool_matrix_from_indices(
+                rows[label], cols[label], states_num
+            )
         return boolean_matrices
 
+    @staticmethod
+    def _bool_matrix_from_indices(
+        rows: array, cols: array, states_num: int
+    ) -> csr_matrix:
+        """Builds boolean adjacency matrix from indices of its nonzero cells
+
+        Args:
+            rows(array): Row indices of nonzero cells
+            cols(array): Column indices of nonzero cells
+            states_num(int): Number of states
+
+        Returns:
+            Boolean adjacency matrix
+        """
+        return coo_matrix(
+            (
+                np.ones(len(rows), dtype=bool),
+                (
+                    np.frombuffer(rows, dtype=np.intc),
+                    np.frombuffer(cols, dtype=np.intc),
+                ),
+            ),
+            shape=(states_num, states_num),
+        ).tocsr()
+
     def _direct_sum(self, other: "BooleanMatrix") -> "BooleanMatrix":
         """Direct sum of automatons
 
+        Label matrices of the sum are block diagonal, so they are assembled
+        by concatenating CSR arrays of both matrices.
+
         Args:
             other(BooleanMatrix): The matrix with which sum will be calculated
 
         Returns:
             Direct sum
         """
-        shifted_states_indices = {}
-        for state, idx in other.state_to_index.items():
-            shifted_states_indices[state] = len(self.state_to_index) + idx
-
-        states_indices = {**self.state_to_index, **shifted_states_indices}
+        self_states = {State((0, s.value)): s for s in self.state_to_index}
+        other_states = {State((1, s.value)): s for s in other.state_to_index}
+        states_indices = {
+            **{s: self.state_to_index[v] for s, v in self_states.items()},
+            **{
+                s: len(self.state_to_index) + other.state_to_index[v]
+                for s, v in other_states.items()
+            },
+        }
         start_states, final_states = (
-            self.start_states | other.start_states,
-            self.final_states | other.final_states,
+            {s for s, v in self_states.items() if v in self.start_states}
+            | {s for s, v in other_states.items() if v in other.start_states},
+            {s for s, v in self_states.items() if v in self.final_states}
+            | {s for s, v in other_states.items() if v in other.final_states},
         )
 
         bool_matrices = {}
         for label in self.bool_matrices.keys() & other.bool_matrices.keys():
-            bool_matrices[label] = bmat(
-                [[self.bool_matrices[label], None], [None, other.bool_matrices[label]]]
+            first = csr_matrix(self.bool_matrices[label], dtype=bool)
+            second = csr_matrix(other.bool_matrices[label], dtype=bool)
+            bool_matrices[label] = csr_matrix(
+                (
+                    np.concatenate([first.data, second.data]),
+                    np.concatenate([first.indices, second.indices + first.shape[1]]),
+                    np.concatenate(
+                        [first.indptr, first.indptr[-1] + second.indptr[1:]]
+                    ),
+                ),
+                shape=(
+                    first.shape[0] + second.shape[0],
+                    first.shape[1] + second.shape[1],
+                ),
             )
 
         return BooleanMatrix(
@@ -253,134 +468,261 @@ class BooleanMatrix:
             return set()
 
         other_states_num = len(other.state_to_index)
-        start_states_ordered = list(self.start_states)
+        self_starts = np.flatnonzero(self._start_mask)
         direct_sum = other._direct_sum(self)
 
         init_front = self._init_sync_bfs_front(
             other,
             reachable_per_node,
-            start_states_ordered,
+            self_starts,
         )
         front = init_front
 
-        visited = front.copy()
+        label_matrices = list(direct_sum.bool_matrices.values())
+        if not label_matrices:
+            visited = front
+        elif (
+            front.shape[0] * front.shape[1] * len(label_matrices)
+            <= _DENSE_FRONT_MAX_CELLS
+        ):
+            visited = self._dense_sync_bfs(
+                front.toarray(),
+                hstack(label_matrices, format="csr"),
+                other_states_num,
+            )
+        else:
+            stacked = vstack(label_matrices, format="csr")
+            visited = front.copy()
+            while front.nnz:
+                front = self._sync_bfs_step(front, visited, stacked, other_states_num)
+                visited += front
+
+        cols_num = visited.shape[1]
+        visited_rows, visited_cols = visited.nonzero()
+        init_rows, init_cols = init_front.nonzero()
+        reached_cells = np.setdiff1d(
+            visited_rows.astype(np.int64) * cols_num + visited_cols,
+            init_rows.astype(np.int64) * cols_num + init_cols,
+        )
+        rows, cols = reached_cells // cols_num, reached_cells % cols_num
+        self_cols = cols - other_states_num
+        reached = (
+            (self_cols >= 0)
+            & other._final_mask[rows % other_states_num]
+            & self._final_mask[np.maximum(self_cols, 0)]
+        )
+        self_states = self._states[self_cols[reached]]
+        if not reachable_per_node:
+            return {state.value for state in self_states}
+        start_states = self._states[self_starts[rows[reached] // other_states_num]]
+        return {
+            (start_state.value, self_state.value)
+            for start_state, self_state in zip(start_states, self_states)
+        }
+
+    @staticmethod
+    def _dense_sync_bfs(
+        front: np.ndarray, stacked: csr_matrix, other_states_num: int
+    ) -> csr_matrix:
+        """Sync bfs with front as dense array and visited cells packed into bits
+
+        Args:
+            front(np.ndarray): Initial front as dense boolean array
+            stacked(csr_matrix): Direct sum matrices of all labels stacked horizontally
+            other_states_num(int): Number of query states
+
+        Returns:
+            Visited cells
+        """
+        rows_num, cols_num = front.shape
+        labels_num = stacked.shape[1] // cols_num
+        visited = np.packbits(front, axis=1)
         while True:
-            visited_nnz = visited.nnz
-            new_front = front.copy()
-
-            for _, matrix in direct_sum.bool_matrices.items():
-                product: csr_matrix = front @ matrix
-                new_front_step = lil_array(product.shape)
-                for i, j in zip(*product.nonzero()):
-                    if j >= other_states_num:
-                        continue
-                    row = product.getrow(i).tolil()[[0], other_states_num:]
-                    if not row.nnz:
-                        continue
-                    row_shift = i // other_states_num * other_states_num
-                    new_front_step[row_shift + j, j] = 1
-                    new_front_step[[row_shift + j], other_states_num:] += row
-                new_front += new_front_step.tocsr()
-
-            for i, j in zip(*new_front.nonzero()):
-                if visited[i, j]:
-                    new_front[i, j] = 0
-
-            visited += new_front
-            front = new_front
-
-            if visited_nnz == visited.nnz:
+            product = (
+                (front @ stacked)
+                .astype(bool, copy=False)
+                .reshape(rows_num, labels_num, cols_num)
+                .transpose(1, 0, 2)
+                .reshape(labels_num * rows_num, cols_num)
+            )
+            left, right = product[:, :other_states_num], product[:, other_states_num:]
+            src, cols = np.nonzero(left & right.any(axis=1)[:, None])
+            dst = src % rows_num // other_states_num * other_states_num + cols
+            new_front = np.zeros_like(front)
+            new_front[dst, cols] = True
+            np.logical_or.at(new_front[:, other_states_num:], dst, right[src])
+            new_bits = np.packbits(new_front, axis=1) & ~visited
+            if not new_bits.any():
                 break
+            visited |= new_bits
+            front = np.unpackbits(new_bits, axis=1, count=cols_num).astype(bool)
+        return csr_matrix(np.unpackbits(visited, axis=1, count=cols_num).astype(bool))
 
-        self_index_to_state = {idx: state for state, idx in self.state_to_index.items()}
-        other_index_to_state = {
-            idx: state for state, idx in other.state_to_index.items()
-        }
+    @classmethod
+    def _sync_bfs_step(
+        cls,
+        front: csr_matrix,
+        visited: csr_matrix,
+        stacked: csr_matrix,
+        other_states_num: int,
+    ) -> csr_matrix:
+        """One step of sync bfs
+
+        Products of front with all label matrices are found by one multiplication
+        of block diagonal copies of front and vertically stacked label matrices.
 
-        result = set()
-        nonzero = set(zip(*visited.nonzero())).difference(
-            set(zip(*init_front.nonzero()))
+        Args:
+            front(csr_matrix): Current front
+            visited(csr_matrix): Cells visited before this step
+            stacked(csr_matrix): Direct sum matrices of all labels stacked vertically
+            other_states_num(int): Number of query states
+
+        Returns:
+            Next front without already visited cells
+        """
+        labels_num = stacked.shape[0] // front.shape[1]
+        product = csr_matrix(
+            kron(identity(labels_num, dtype=bool), front, format="csr") @ stacked
+        )
+        return (
+            cls._shift_front_product(product, front.shape[0], other_states_num)
+            > visited
+        )
+
+    @staticmethod
+    def _shift_front_product(
+        product: csr_matrix, rows_num: int, other_states_num: int
+    ) -> csr_matrix:
+        """Moves rows of front and direct sum product to rows of reached query states
+
+        Each row of front has single query state in left block, so nonzero columns
+        of product left block are query states reached from it. Right block row is
+        moved to rows of these query states by one permutation matrix product.
+
+        Args:
+            product(csr_matrix): Products of front and label matrices stacked vertically
+            rows_num(int): Number of front rows
+            other_states_num(int): Number of query states
+
+        Returns:
+            Front step for given product
+        """
+        left = product[:, :other_states_num].tocoo()
+        right = product[:, other_states_num:]
+        has_right = np.diff(right.indptr) > 0
+        src = left.row[has_right[left.row]]
+        dst = (
+            src % rows_num // other_states_num * other_states_num
+            + left.col[has_right[left.row]]
+        )
+        shift = csr_matrix(
+            (np.ones(len(src), dtype=bool), (dst, src)),
+            shape=(rows_num, product.shape[0]),
+        )
+        dst = np.unique(dst)
+        return hstack(
+            [
+                csr_matrix(
+                    (np.ones(len(dst), dtype=bool), (dst, dst % other_states_num)),
+                    shape=(rows_num, other_states_num),
+                ),
+                shift @ right,
+            ],
+            format="csr",
         )
-        for i, j in nonzero:
-            if (
-                other_index_to_state[i % other_states_num] not in other.final_states
-                or j < other_states_num
-            ):
-                continue
-            self_state = self_index_to_state[j - other_states_num]
-            if self_state not in self.final_states:
-                continue
-            result.add(
-                self_state.value
-                if not reachable_per_node
-                else (
-                    start_states_ordered[i // other_states_num].value,
-                    self_state.value,
-                )
-            )
-        return result
 
     def _init_sync_bfs_front(
         self,
         other: "BooleanMatrix",
         reachable_per_node: bool,
-        ordered_start_states: List[State],
+        self_starts: np.ndarray,
     ) -> csr_matrix:
         """Front for sync bfs
 
         Args:
             other(BooleanMatrix): BooleanMatrix with which bfs will be executed
             reachable_per_node(bool): Reachability for each node separately or not
-            ordered_start_states(List[State]): List of start states
+            self_starts(np.ndarray): Indices of self start states
         Returns:
             Initial front for sync bfs
         """
 
-        def front_with_self_start(self_start_row: lil_array):
-            front = lil_array(
-                (
-                    len(other.state_to_index),
-                    len(self.state_to_index) + len(other.state_to_index),
-                )
-            )
-            for state in other.start_states:
-                idx = other.state_to_index[state]
-                front[idx, idx] = 1
-                front[idx, len(other.state_to_index) :] = self_start_row
-            return front
+        other_states_num = len(other.state_to_index)
+        other_starts = np.flatnonzero(other._start_mask)
+        if reachable_per_node:
+            blocks_num = len(self_starts)
+            diag_rows = (
+                np.arange(blocks_num)[:, None] * other_states_num + other_starts
+            ).ravel()
+            self_rows = diag_rows
+            self_cols = np.repeat(self_starts, len(other_starts))
+        else:
+            blocks_num = 1
+            diag_rows = other_starts
+            self_rows = np.repeat(other_starts, len(self_starts))
+            self_cols = np.tile(self_starts, len(other_starts))
+
+        rows = np.concatenate([diag_rows, self_rows])
+        cols = np.concatenate(
+            [diag_rows % other_states_num, self_cols + other_states_num]
+        )
+        return coo_matrix(
+            (np.ones(len(rows), dtype=bool), (rows, cols)),
+            shape=(
+                max(blocks_num, 1) * other_states_num,
+                len(self.state_to_index) + other_states_num,
+            ),
+        ).tocsr()
 
-        if not reachable_per_node:
-            start_indices = set(
-                self.state_to_index[state] for state in ordered_start_states
-            )
-            return front_with_self_start(
-                lil_array(
-                    [
-                        1 if index in start_indices else 0
-                        for index in range(len(self.state_to_index))
-                    ]
-                )
-            ).tocsr()
-
-        fronts = [
-            front_with_self_start(
-                lil_array(
-                    [
-                        1 if idx == self.state_to_index[start] else 0
-                        for idx in range(len(self.state_to_index))
-                    ]
-                )
+
+class _ProductStateToIndex(Mapping):
+    """Lazy mapping of intersection states to indices in boolean matrix
+
+    Intersection state is pair of operand state values, its index is index of first
+    operand state multiplied by number of second operand states plus index of second
+    operand state, so states are not materialized until iteration.
+
+    Attributes:
+        first(BooleanMatrix): First operand of intersection
+        second(BooleanMatrix): Second operand of intersection
+    """
+
+    def __init__(self, first: BooleanMatrix, second: BooleanMatrix):
+        self.first = first
+        self.second = second
+
+    def state(self, idx: int) -> State:
+        """Intersection state by its index
+
+        Args:
+            idx(int): Index of intersection state
+
+        Returns:
+            Intersection state
+        """
+        first_idx, second_idx = divmod(idx, len(self.second.state_to_index))
+        return State(
+            (
+                self.first._states[first_idx].value,
+                self.second._states[second_idx].value,
             )
-            for start in ordered_start_states
-        ]
+        )
 
+    def __getitem__(self, state: State) -> int:
+        try:
+            first_value, second_value = state.value
+        except (AttributeError, TypeError, ValueError):
+            raise KeyError(state)
         return (
-            csr_matrix(vstack(fronts))
-            if fronts
-            else csr_matrix(
-                (
-                    len(other.state_to_index),
-                    len(self.state_to_index) + len(other.state_to_index),
-                )
-            )
+            self.first.state_to_index[State(first_value)]
+            * len(self.second.state_to_index)
+            + self.second.state_to_index[State(second_value)]
         )
+
+    def __iter__(self) -> Iterator[State]:
+        for first_state in self.first._states:
+            for second_state in self.second._states:
+                yield State((first_state.value, second_state.value))
+
+    def __len__(self) -> int:
+        return len(self.first.state_to_index) * len(self.second.state_to_index)
@@ -1,9 +1,10 @@
 from collections import defaultdict
-from functools import reduce
-from typing import Union, IO, List
+from functools import lru_cache, reduce
+from typing import AbstractSet, FrozenSet, Union, IO, List, Tuple
 
-from pyformlang.cfg import CFG, Variable
+from pyformlang.cfg import CFG, Production, Terminal, Variable
 from pyformlang.cfg.cfg_object import CFGObject
+from pyformlang.finite_automaton import DeterministicFiniteAutomaton, State, Symbol
 from pyformlang.regular_expression import Regex
 from project.rsm import RSM
 from project.ecfg import ECFG
@@ -14,6 +15,7 @@ __all__ = [
     "cfg_to_ecfg",
     "ecfg_from_file",
     "ecfg_to_rsm",
+    "cfg_to_rsm",
 ]
 
 
@@ -25,18 +27,35 @@ def cfg_to_weak_chomsky_normal_form(cfg: CFG) -> CFG:
     Returns:
         Converted CFG
     """
+    start_symbol, productions = _cfg_to_weak_chomsky_normal_form(
+        cfg.start_symbol, frozenset(cfg.productions)
+    )
+    return CFG(start_symbol=start_symbol, productions=set(productions))
+
+
+@lru_cache(maxsize=256)
+def _cfg_to_weak_chomsky_normal_form(
+    start_symbol: Variable, productions: FrozenSet[Production]
+) -> Tuple[Variable, FrozenSet[Production]]:
+    """Converts CFG given by start symbol and productions to Weak Chomsky Normal Form,
+    memoized by them
+
+    Args:
+        start_symbol(Variable): Start symbol of CFG
+        productions(FrozenSet[Production]): Productions of CFG
+    Returns:
+        Start symbol and productions of converted CFG
+    """
+    cfg = CFG(start_symbol=start_symbol, productions=set(productions))
     cfg_fixed = (
         cfg.remove_useless_symbols()
         .eliminate_unit_productions()
         .remove_useless_symbols()
     )
-    return CFG(
-        start_symbol=cfg_fixed.start_symbol,
-        productions=set(
-            cfg_fixed._decompose_productions(
-                cfg_fixed._get_productions_with_only_single_terminals()
-            )
-        ),
+    return cfg_fixed.start_symbol, frozenset(
+        cfg_fixed._decompose_productions(
+            cfg_fixed._get_productions_with_only_single_terminals()
+        )
     )
 
 
@@ -52,7 +71,28 @@ def get_cfg_from_file(
         Loaded CFG
     """
     with open(file) as f:
-        return CFG.from_text(f.read(), start_symbol=start_symbol)
+        variables, terminals, productions = _parse_cfg_text(f.read(), start_symbol)
+    return CFG(set(variables), set(terminals), start_symbol, set(productions))
+
+
+@lru_cache(maxsize=256)
+def _parse_cfg_text(
+    text: str, start_symbol: Union[str, Variable]
+) -> Tuple[FrozenSet[Variable], FrozenSet[Terminal], FrozenSet[Production]]:
+    """Parses CFG from text, memoized by text and start symbol
+
+    Args:
+        text(str): Text that contains context free grammar
+        start_symbol(Union[str, Variable]): CFG start symbol
+    Returns:
+        Variables, terminals and productions of obtained CFG
+    """
+    cfg = CFG.from_text(text, start_symbol=start_symbol)
+    return (
+        frozenset(cfg.variables),
+        frozenset(cfg.terminals),
+        frozenset(cfg.productions),
+    )
 
 
 def cfg_to_ecfg(cfg: CFG) -> ECFG:
@@ -70,7 +110,7 @@ def cfg_to_ecfg(cfg: CFG) -> ECFG:
         start_symbol=cfg.start_symbol,
         variables=cfg.variables,
         productions={
-            h: reduce(Regex.union, map(concat_body, bodies))
+            h: ECFG.union_bodies(list(map(concat_body, bodies)))
             for h, bodies in productions.items()
         },
     )
@@ -99,13 +139,35 @@ def ecfg_to_rsm(ecfg: ECFG) -> RSM:
     Returns:
         Recursive state machine
     """
-    return RSM(
-        start_symbol=ecfg.start_symbol,
-        boxes={
-            h: r.to_epsilon_nfa().to_deterministic()
-            for h, r in ecfg.productions.items()
-        },
-    )
+    return ecfg.to_rsm()
+
+
+def cfg_to_rsm(cfg: CFG) -> RSM:
+    """Converts CFG to RSM without intermediate regular expressions
+
+    Bodies of each non-terminal are merged into a prefix tree, which is
+    already a deterministic automaton, so no subset construction is needed
+
+    Args:
+        cfg(CFG): CFG to be converted
+    Returns:
+        Recursive state machine
+    """
+    boxes = defaultdict(DeterministicFiniteAutomaton)
+    children = defaultdict(dict)
+    for p in cfg.productions:
+        box = boxes[p.head]
+        box.add_start_state(State(0))
+        state = 0
+        for o in p.body:
+            symbol = Symbol(o.value)
+            next_state = children[p.head, state].get(symbol)
+            if next_state is None:
+                next_state = children[p.head, state][symbol] = len(box.states)
+                box.add_transition(State(state), symbol, State(next_state))
+            state = next_state
+        box.add_final_state(State(state))
+    return RSM(start_symbol=cfg.start_symbol, boxes=dict(boxes))
 
 
 def concat_body(body: List[CFGObject]) -> Regex:
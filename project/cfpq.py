@@ -1,15 +1,20 @@
 from collections import defaultdict, deque
 from enum import Enum, auto
-from typing import Union, Set, Any, Tuple, Collection, Dict
+from itertools import repeat
+from typing import Union, Set, Any, Tuple, Dict, List, Iterable
 
 from networkx import MultiDiGraph
-from pyformlang.cfg import CFG, Variable, Terminal, Production
+from pyformlang.cfg import CFG, Variable
 from pyformlang.finite_automaton import EpsilonNFA
-from scipy.sparse import dok_matrix, eye
+import numpy as np
+from scipy.sparse import csr_matrix, eye
 
 from project.boolean_matrix import BooleanMatrix
-from project.cfg_utils import get_cfg_from_file, cfg_to_weak_chomsky_normal_form
-from project.ecfg import ECFG
+from project.cfg_utils import (
+    get_cfg_from_file,
+    cfg_to_weak_chomsky_normal_form,
+    cfg_to_rsm,
+)
 from project.graph_utils import load_graph
 
 __all__ = ["cfpq", "CFPQAlgorithm"]
@@ -55,7 +60,7 @@ def cfpq(
         graph = load_graph(graph)
     if isinstance(cfg, str):
         cfg = get_cfg_from_file(cfg)
-    cfg._start_symbol = start_symbol
+    cfg = CFG(cfg.variables, cfg.terminals, start_symbol, set(cfg.productions))
 
     if not start_nodes:
         start_nodes = graph.nodes
@@ -95,39 +100,63 @@ def _run_hellings_algorithm(
     if not n:
         return set()
 
+    nodes = list(graph.nodes)
+    node_to_idx = {node: idx for idx, node in enumerate(nodes)}
+
     wcnf = cfg_to_weak_chomsky_normal_form(cfg)
-    non_term_eps, term_prods, non_term_two_prods = _convert_wcnf_prods(wcnf.productions)
+    non_terms, non_term_eps, heads_by_term, non_term_two_prods = _convert_wcnf_prods(
+        wcnf
+    )
 
-    by_eps = {(i, n, i) for i in graph.nodes for n in non_term_eps}
-    by_term = {
-        (i, n, j)
+    # Triple (i, k, j) is encoded as a single int (i * n + j) * non_terms_num + k
+    non_terms_num = len(non_terms)
+    result = {(i * n + i) * non_terms_num + k for i in range(n) for k in non_term_eps}
+    result.update(
+        (node_to_idx[i] * n + node_to_idx[j]) * non_terms_num + head
         for i, j, label in graph.edges(data="label")
-        for n, terms in term_prods.items()
-        if Terminal(label) in terms
-    }
+        for head in heads_by_term.get(label, ())
+    )
+
+    heads_by_body = defaultdict(list)
+    for head, body_fst, body_snd in non_term_two_prods:
+        heads_by_body[body_fst, body_snd].append(head)
 
-    result = by_eps | by_term
-    result_deque = deque(result.copy())
+    in_by_end, out_by_start = [[] for _ in range(n)], [[] for _ in range(n)]
+    result_deque = deque()
+    for triple in result:
+        ij, k = divmod(triple, non_terms_num)
+        i, j = divmod(ij, n)
+        out_by_start[i].append((k, j))
+        in_by_end[j].append((i, k))
+        result_deque.append((i, k, j))
 
     while result_deque:
-        i, n1, j = result_deque.popleft()
-        to_add = set()
-        for r, n2, l in result:
-            if l == i:
-                for n, non_term_two in non_term_two_prods.items():
-                    new = (r, n, j)
-                    if (n2, n1) in non_term_two and new not in result:
-                        result_deque.append(new)
-                        to_add.add(new)
-            if j == r:
-                for n, non_term_two in non_term_two_prods.items():
-                    new = (i, n, l)
-                    if (n1, n2) in non_term_two and new not in result:
-                        result_deque.append(new)
-                        to_add.add(new)
-        result |= to_add
-
-    return result
+        i, k1, j = result_deque.popleft()
+        # Index updates are deferred so the lists iterated below stay unchanged
+        added = []
+        for r, k2 in in_by_end[i]:
+            for k in heads_by_body.get((k2, k1), ()):
+                new = (r * n + j) * non_terms_num + k
+                if new not in result:
+                    result.add(new)
+                    added.append((r, k, j))
+        for k2, l in out_by_start[j]:
+            for k in heads_by_body.get((k1, k2), ()):
+                new = (i * n + l) * non_terms_num + k
+                if new not in result:
+                    result.add(new)
+                    added.append((i, k, l))
+        for r, k, l in added:
+            out_by_start[r].append((k, l))
+            in_by_end[l].append((r, k))
+        result_deque.extend(added)
+
+    triples = set()
+    for triple in result:
+        ij, k = divmod(triple, non_terms_num)
+        i, j = divmod(ij, n)
+        triples.add((nodes[i], non_terms[k], nodes[j]))
+    return triples
 
 
 def _run_matrix_algorithm(
@@ -149,39 +178,60 @@ def _run_matrix_algorithm(
     node_to_idx = {node: idx for idx, node in enumerate(nodes)}
 
     wcnf = cfg_to_weak_chomsky_normal_form(cfg)
-    eps_nonterm, term_prods, two_nonterm_prods = _convert_wcnf_prods(wcnf.productions)
-
-    nonterm_to_mtx = {
-        nonterm: dok_matrix((n, n), dtype=bool) for nonterm in wcnf.variables
-    }
-
-    for i in range(n):
-        for nonterm in eps_nonterm:
-            nonterm_to_mtx[nonterm][i, i] = True
+    nonterms, eps_nonterms, heads_by_term, two_nonterm_prods = _convert_wcnf_prods(wcnf)
 
+    rows, cols = defaultdict(list), defaultdict(list)
     for i_node, j_node, label in graph.edges(data="label"):
-        i, j = node_to_idx[i_node], node_to_idx[j_node]
-        for nonterm in {
-            n for n, terms in term_prods.items() if Terminal(label) in terms
-        }:
-            nonterm_to_mtx[nonterm][i, j] = True
-
-    while True:
-        changed = False
-        for nonterm, two_nonterms in two_nonterm_prods.items():
-            old_nnz = nonterm_to_mtx[nonterm].nnz
-            nonterm_to_mtx[nonterm] += sum(
-                nonterm_to_mtx[n1] @ nonterm_to_mtx[n2] for n1, n2 in two_nonterms
+        rows[label].append(node_to_idx[i_node])
+        cols[label].append(node_to_idx[j_node])
+
+    mtxs = [csr_matrix((n, n), dtype=bool) for _ in nonterms]
+    for label, heads in heads_by_term.items():
+        if label not in rows:
+            continue
+        label_mtx = csr_matrix(
+            (np.ones(len(rows[label]), dtype=bool), (rows[label], cols[label])),
+            shape=(n, n),
+        )
+        for head in heads:
+            mtxs[head] += label_mtx
+    self_loop_mtx = eye(n, dtype=bool, format="csr")
+    for nonterm in eps_nonterms:
+        mtxs[nonterm] += self_loop_mtx
+
+    deltas = mtxs.copy()
+    while any(delta.nnz for delta in deltas):
+        # Products are merged with a single CSR build per non-terminal rather
+        # than a chain of pairwise sparse additions
+        rows, cols = [[] for _ in nonterms], [[] for _ in nonterms]
+        for head, body_fst, body_snd in two_nonterm_prods:
+            for left, right in (
+                (deltas[body_fst], mtxs[body_snd]),
+                (mtxs[body_fst], deltas[body_snd]),
+            ):
+                if left.nnz and right.nnz:
+                    product = (left @ right).tocoo()
+                    rows[head].append(product.row)
+                    cols[head].append(product.col)
+        deltas = [
+            (
+                csr_matrix(
+                    (
+                        np.ones(sum(map(len, rows[nonterm])), dtype=bool),
+                        (np.concatenate(rows[nonterm]), np.concatenate(cols[nonterm])),
+                    ),
+                    shape=(n, n),
+                )
+                > mtx
+                if rows[nonterm]
+                else csr_matrix((n, n), dtype=bool)
             )
-            changed |= old_nnz != nonterm_to_mtx[nonterm].nnz
-        if not changed:
-            break
-
-    return set(
-        (nodes[i], nonterm, nodes[j])
-        for nonterm, mtx in nonterm_to_mtx.items()
-        for i, j in zip(*mtx.nonzero())
-    )
+            for nonterm, mtx in enumerate(mtxs)
+        ]
+        for nonterm, delta in enumerate(deltas):
+            mtxs[nonterm] += delta
+
+    return _get_triples(nodes, zip(nonterms, mtxs))
 
 
 def _run_tensor_algorithm(
@@ -195,71 +245,151 @@ def _run_tensor_algorithm(
     Returns:
         Triples of vertices with specified constraints and a non-terminal from path is derived
     """
-    cfg_bool_matrix = BooleanMatrix.from_rsm(ECFG.from_cfg(cfg).to_rsm())
-    cfg_index_to_state = {i: s for s, i in cfg_bool_matrix.state_to_index.items()}
+    cfg_bool_matrix = BooleanMatrix.from_rsm(cfg_to_rsm(cfg))
     graph_bool_matrix = BooleanMatrix.from_nfa(EpsilonNFA.from_networkx(graph))
     graph_bool_matrix_states = len(graph_bool_matrix.state_to_index)
     graph_index_to_state = {i: s for s, i in graph_bool_matrix.state_to_index.items()}
-    self_loop_matrix = eye(len(graph_bool_matrix.state_to_index), dtype=bool).todok()
+    self_loop_matrix = eye(graph_bool_matrix_states, dtype=bool, format="csr")
     for nonterm in cfg.get_nullable_symbols():
         graph_bool_matrix.bool_matrices[nonterm.value] += self_loop_matrix
-    last_tc_sz = 0
-    while True:
-        intersection = cfg_bool_matrix & graph_bool_matrix
-        tc_indices = list(zip(*intersection.get_transitive_closure().nonzero()))
-        if len(tc_indices) == last_tc_sz:
-            break
-        last_tc_sz = len(tc_indices)
-        for i, j in tc_indices:
-            cfg_i, cfg_j = i // graph_bool_matrix_states, j // graph_bool_matrix_states
-            graph_i, graph_j = (
-                i % graph_bool_matrix_states,
-                j % graph_bool_matrix_states,
+
+    # Paths of the intersection are explored box by box over RSM transitions,
+    # so the Kronecker product of the matrices is never materialized
+    cfg_transitions = defaultdict(list)
+    for label, mtx in cfg_bool_matrix.bool_matrices.items():
+        for cfg_i, cfg_j in zip(*mtx.nonzero()):
+            cfg_transitions[cfg_i].append((label, cfg_j))
+    cfg_finals = [
+        cfg_bool_matrix.state_to_index[s] for s in cfg_bool_matrix.final_states
+    ]
+    cfg_starts = [
+        (cfg_bool_matrix.state_to_index[s], s.value[0])
+        for s in cfg_bool_matrix.start_states
+    ]
+    changed = True
+    while changed:
+        changed = False
+        for cfg_start, nonterm in cfg_starts:
+            derived = _get_box_paths(
+                cfg_transitions,
+                cfg_start,
+                cfg_finals,
+                graph_bool_matrix.bool_matrices,
+                graph_bool_matrix_states,
             )
-            state_from, state_to = cfg_index_to_state[cfg_i], cfg_index_to_state[cfg_j]
-            nonterm, _ = state_from.value
-            if (
-                state_from in cfg_bool_matrix.start_states
-                and state_to in cfg_bool_matrix.final_states
-            ):
-                graph_bool_matrix.bool_matrices[nonterm][graph_i, graph_j] = True
-    return {
-        (graph_index_to_state[graph_i], nonterm, graph_index_to_state[graph_j])
-        for nonterm, mtx in graph_bool_matrix.bool_matrices.items()
-        for graph_i, graph_j in zip(*mtx.nonzero())
-    }
+            delta = derived > graph_bool_matrix.bool_matrices[nonterm]
+            if delta.nnz:
+                graph_bool_matrix.bool_matrices[nonterm] += delta
+                changed = True
+    return _get_triples(
+        [graph_index_to_state[i] for i in range(graph_bool_matrix_states)],
+        graph_bool_matrix.bool_matrices.items(),
+    )
+
+
+def _get_box_paths(
+    cfg_transitions: Dict[int, List[Tuple[Any, int]]],
+    cfg_start: int,
+    cfg_finals: List[int],
+    graph_matrices: Dict[Any, csr_matrix],
+    graph_states: int,
+) -> csr_matrix:
+    """Utility function for finding graph paths accepted by a box of recursive state machine
+
+    Args:
+        cfg_transitions(Dict[int, List[Tuple[Any, int]]]): Labeled transitions of RSM states
+        cfg_start(int): Start state of the box
+        cfg_finals(List[int]): Final states of RSM
+        graph_matrices(Dict[Any, csr_matrix]): Boolean matrices of graph by labels
+        graph_states(int): Number of graph vertices
+    Returns:
+        Boolean matrix of vertices connected by a non-empty path accepted by the box
+    """
+    empty = csr_matrix((graph_states, graph_states), dtype=bool)
+    reached = {}
+    front = {cfg_start: eye(graph_states, dtype=bool, format="csr")}
+    while front:
+        next_front = {}
+        for cfg_i, mtx in front.items():
+            for label, cfg_j in cfg_transitions[cfg_i]:
+                graph_mtx = graph_matrices.get(label)
+                if graph_mtx is not None and graph_mtx.nnz:
+                    next_front[cfg_j] = next_front.get(cfg_j, empty) + mtx @ graph_mtx
+        front = {}
+        for cfg_j, mtx in next_front.items():
+            delta = mtx > reached.get(cfg_j, empty)
+            if delta.nnz:
+                reached[cfg_j] = reached.get(cfg_j, empty) + delta
+                front[cfg_j] = delta
+    return sum((reached.get(cfg_i, empty) for cfg_i in cfg_finals), start=empty)
+
+
+def _get_triples(
+    nodes: List[Any], labeled_matrices: Iterable[Tuple[Any, csr_matrix]]
+) -> Set[Tuple[Any, Any, Any]]:
+    """Utility function for collecting triples of vertices and labels from boolean matrices
+
+    Args:
+        nodes(List[Any]): Vertices listed by their indices in matrices
+        labeled_matrices(Iterable[Tuple[Any, csr_matrix]]): Pairs of label and its boolean matrix
+    Returns:
+        Triples of vertices with label of matrix in which they are connected
+    """
+    nodes_array = np.empty(len(nodes), dtype=object)
+    for idx, node in enumerate(nodes):
+        nodes_array[idx] = node
+    triples = set()
+    for label, mtx in labeled_matrices:
+        rows, cols = mtx.nonzero()
+        triples.update(
+            zip(
+                nodes_array[rows].tolist(),
+                repeat(label, len(rows)),
+                nodes_array[cols].tolist(),
+            )
+        )
+    return triples
 
 
 def _convert_wcnf_prods(
-    prods: Collection[Production],
+    wcnf: CFG,
 ) -> Tuple[
-    Set[Variable],
-    Dict[Variable, Set[Terminal]],
-    Dict[Variable, Set[Tuple[Variable, Variable]]],
+    List[Variable],
+    List[int],
+    Dict[Any, List[int]],
+    List[Tuple[int, int, int]],
 ]:
     """Utility function for converting productions of context-free grammar in Weak Chomsky Normal Form
+    to integer ids of its non-terminals
 
     Args:
-        prods(Collection[Production]): Productions
+        wcnf(CFG): Context-free grammar in Weak Chomsky Normal Form
     Returns:
-        Triple of set of non-terminals that produces epsilon, mapping from non-terminal to (non)terminal that it produces
+        Non-terminals listed by their ids, ids of non-terminals that produce epsilon,
+        mapping from terminal value to ids of non-terminals that produce it
+        and (head, first body, second body) ids of productions of two non-terminals
     """
-    eps_nonterm = set()
-    term_prods = defaultdict(set)
-    two_nonterm_prods = defaultdict(set)
-
-    for p in prods:
-        head, body = p.head, p.body
+    non_terms = list(wcnf.variables)
+    non_term_to_idx = {non_term: idx for idx, non_term in enumerate(non_terms)}
+    eps_non_terms = []
+    heads_by_term = defaultdict(list)
+    two_non_term_prods = []
+
+    for p in wcnf.productions:
+        head, body = non_term_to_idx[p.head], p.body
         body_len = len(body)
         if body_len == 0:
-            eps_nonterm.add(head)
+            eps_non_terms.append(head)
         elif body_len == 1:
-            term_prods[head].add(body[0])
+            heads_by_term[body[0].value].append(head)
         elif body_len == 2:
-            two_nonterm_prods[head].add((body[0], body[1]))
+            two_non_term_prods.append(
+                (head, non_term_to_idx[body[0]], non_term_to_idx[body[1]])
+            )
 
     return (
-        eps_nonterm,
-        term_prods,
-        two_nonterm_prods,
+        non_terms,
+        eps_non_terms,
+        heads_by_term,
+        two_non_term_prods,
     )
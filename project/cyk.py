@@ -1,4 +1,8 @@
-from pyformlang.cfg import CFG
+from functools import lru_cache
+from typing import AbstractSet, Dict, Tuple
+
+import numpy as np
+from pyformlang.cfg import CFG, Production, Variable
 
 __all__ = [
     "cyk",
@@ -8,6 +12,9 @@ __all__ = [
 def cyk(s: str, cfg: CFG) -> bool:
     """Check the word belongs to the language generated by the given CFG using CYK algorithm
 
+    Cells of the table are boolean vectors over non-terminals, so every cell
+    is filled by a few array operations over all its splits at once
+
     Args:
         s(str): Word to be checked
         cfg(CFG): Context Free Grammar
@@ -18,24 +25,76 @@ def cyk(s: str, cfg: CFG) -> bool:
     if not s:
         return cfg.generate_epsilon()
 
-    terminals, non_terminals = (
-        [p for p in cfg.to_normal_form().productions if len(p.body) == body_length]
-        for body_length in (1, 2)
+    non_term_to_idx, term_masks, body_heads = _get_normal_form_heads(
+        cfg.start_symbol, frozenset(cfg.productions)
     )
+    if cfg.start_symbol not in non_term_to_idx:
+        return False
+    non_terms_num = len(non_term_to_idx)
     n = len(s)
-    table = [[set() for _ in range(n)] for _ in range(n)]
+    table = np.zeros((n, n, non_terms_num), dtype=bool)
 
     for i, c in enumerate(s):
-        table[i][i] = set(p.head for p in terminals if p.body[0].value == c)
+        if c in term_masks:
+            table[i, i] = term_masks[c]
 
     for step in range(1, n):
         for i in range(n - step):
             j = i + step
-            for k in range(i, j):
-                table[i][j] |= set(
-                    p.head
-                    for p in non_terminals
-                    if p.body[1] in table[k + 1][j] and p.body[0] in table[i][k]
+            # Pairs of non-terminals met in cells (i, k) and (k + 1, j) for any split k
+            bodies = table[i, i:j].T @ table[i + 1 : j + 1, j]
+            if bodies.any():
+                table[i, j] = np.unpackbits(
+                    np.bitwise_or.reduce(body_heads[bodies], axis=0),
+                    count=non_terms_num,
+                    bitorder="little",
                 )
 
-    return cfg.start_symbol in table[0][n - 1]
+    return bool(table[0, n - 1, non_term_to_idx[cfg.start_symbol]])
+
+
+@lru_cache(maxsize=256)
+def _get_normal_form_heads(
+    start_symbol: Variable, productions: AbstractSet[Production]
+) -> Tuple[Dict[Variable, int], Dict[str, np.ndarray], np.ndarray]:
+    """Converts CFG given by start symbol and productions to Chomsky Normal Form, memoized by them
+
+    Args:
+        start_symbol(Variable): Start symbol of CFG
+        productions(AbstractSet[Production]): Productions of CFG
+
+    Returns:
+        Indices of non-terminals, mapping from terminal value to boolean mask
+        of heads that produce it and array of packed masks of heads indexed by
+        pair of body non-terminals, all must not be modified
+    """
+    cnf = CFG(start_symbol=start_symbol, productions=set(productions)).to_normal_form()
+    non_term_to_idx = {v: idx for idx, v in enumerate(cnf.variables)}
+    non_terms_num = len(non_term_to_idx)
+    term_masks = {}
+    fsts, snds, heads = [], [], []
+    for p in cnf.productions:
+        head = non_term_to_idx[p.head]
+        if len(p.body) == 1:
+            term_masks.setdefault(p.body[0].value, np.zeros(non_terms_num, dtype=bool))[
+                head
+            ] = True
+        elif len(p.body) == 2:
+            fsts.append(non_term_to_idx[p.body[0]])
+            snds.append(non_term_to_idx[p.body[1]])
+            heads.append(head)
+    # Heads are scattered straight into bits in little bit order, as cyk unpacks them
+    fsts, snds, heads = (np.array(idx, dtype=np.intp) for idx in (fsts, snds, heads))
+    body_heads = np.zeros(
+        (non_terms_num, non_terms_num, (non_terms_num + 7) // 8), dtype=np.uint8
+    )
+    np.bitwise_or.at(
+        body_heads,
+        (fsts, snds, heads >> 3),
+        np.left_shift(1, heads & 7).astype(np.uint8),
+    )
+    return (
+        non_term_to_idx,
+        term_masks,
+        body_heads,
+    )
@@ -1,9 +1,11 @@
 from collections import defaultdict
-from functools import reduce
-from typing import NamedTuple, Dict, AbstractSet, List
+from dataclasses import dataclass, field
+from functools import lru_cache, reduce
+from typing import NamedTuple, Dict, AbstractSet, List, Tuple
 
 from pyformlang.cfg import Variable, CFG
 from pyformlang.cfg.cfg_object import CFGObject
+from pyformlang.finite_automaton import DeterministicFiniteAutomaton
 from pyformlang.regular_expression import Regex
 
 from project.rsm import RSM
@@ -36,20 +38,10 @@ class ECFG(NamedTuple):
         Returns:
             Obtained context free grammar
         """
-        variables = set()
-        prods = dict()
-        for line in text.splitlines():
-            if line.strip():
-                data = [str.strip(e) for e in line.split("->")]
-                assert len(data) == 2
-                head, body = data
-                head, body = Variable(head), Regex(body)
-                assert head not in variables
-                variables.add(head)
-                prods[head] = body
+        prods = dict(_parse_productions(text))
         return cls(
             start_symbol=start_symbol,
-            variables=variables,
+            variables=set(prods),
             productions=prods,
         )
 
@@ -69,7 +61,7 @@ class ECFG(NamedTuple):
             cfg.start_symbol,
             cfg.variables,
             {
-                h: reduce(Regex.union, map(cls.concat_body, bodies))
+                h: cls.union_bodies(list(map(cls.concat_body, bodies)))
                 for h, bodies in productions.items()
             },
         )
@@ -82,10 +74,7 @@ class ECFG(NamedTuple):
         """
         return RSM(
             self.start_symbol,
-            {
-                h: r.to_epsilon_nfa().to_deterministic()
-                for h, r in self.productions.items()
-            },
+            {h: _regex_to_box(r) for h, r in self.productions.items()},
         )
 
     @staticmethod
@@ -102,3 +91,97 @@ class ECFG(NamedTuple):
             if body
             else Regex("$")
         )
+
+    @staticmethod
+    def union_bodies(bodies: List[Regex]) -> Regex:
+        """Utility function for uniting regexes of production bodies
+
+        Union tree is balanced, so its depth and epsilon paths in NFA grow
+        logarithmically with number of bodies
+
+        Args:
+            bodies(List[Regex]): Non-empty list of regexes of production bodies
+        Returns:
+            Regular expression
+        """
+        if len(bodies) == 1:
+            return bodies[0]
+        middle = len(bodies) // 2
+        return ECFG.union_bodies(bodies[:middle]).union(
+            ECFG.union_bodies(bodies[middle:])
+        )
+
+
+@lru_cache(maxsize=256)
+def _parse_productions(text: str) -> Tuple[Tuple[Variable, Regex], ...]:
+    """Parses ECFG productions from text, memoized by text
+
+    Args:
+        text(str): Text that contains extended context free grammar
+    Returns:
+        Pairs of production heads and bodies in order of appearance
+    """
+    prods = dict()
+    for line in text.splitlines():
+        if line.strip():
+            data = [str.strip(e) for e in line.split("->")]
+            assert len(data) == 2
+            head, body = data
+            head, body = Variable(head), Regex(body)
+            assert head not in prods
+            prods[head] = body
+    return tuple(prods.items())
+
+
+def _regex_to_box(regex: Regex) -> DeterministicFiniteAutomaton:
+    """Converts regex to deterministic automaton of RSM box, memoized by regex tree
+
+    Args:
+        regex(Regex): Regular expression
+    Returns:
+        Copy of memoized deterministic automaton
+    """
+    return _build_box(_BoxKey(_regex_tree(regex), regex)).copy()
+
+
+@dataclass(frozen=True)
+class _BoxKey:
+    """Key of memoized box, compared only by tree of its regex
+
+    Attributes:
+        tree(Tuple): Tree of node types and values of regex
+        regex(Regex): Regular expression with this tree
+    """
+
+    tree: Tuple
+    regex: Regex = field(compare=False)
+
+
+def _regex_tree(regex: Regex) -> Tuple:
+    """Tree of regex as nested tuples of node types, node values and sons
+
+    Unlike regex text, the tree does not mix up symbols containing operators
+    with the operators themselves
+
+    Args:
+        regex(Regex): Regular expression
+    Returns:
+        Tree of regex
+    """
+    return (
+        type(regex.head).__name__,
+        regex.head.value,
+        tuple(map(_regex_tree, regex.sons)),
+    )
+
+
+@lru_cache(maxsize=1024)
+def _build_box(key: _BoxKey) -> DeterministicFiniteAutomaton:
+    """Builds deterministic automaton of RSM box, memoized by regex tree
+
+    Args:
+        key(_BoxKey): Key with regular expression
+    Returns:
+        Deterministic automaton, must not be modified
+    """
+    return key.regex.to_epsilon_nfa().to_deterministic()
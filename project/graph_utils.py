@@ -1,7 +1,16 @@
 import cfpq_data
-from networkx import *
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from functools import lru_cache
+from networkx import MultiDiGraph
+from networkx.drawing.nx_pydot import write_dot
+from pyformlang.finite_automaton import State
+from scipy.sparse import coo_matrix, csr_matrix
 from typing import NamedTuple, Set, Tuple, Union, IO
 
+from project.boolean_matrix import BooleanMatrix
+
 __all__ = [
     "Graph",
     "load_graph",
@@ -34,12 +43,89 @@ def load_graph(graph_name: str) -> MultiDiGraph:
         graph_name (str): Name of the graph to be loaded from the dataset.
 
     Returns:
-        Class loaded from csv file
+        Class loaded from csv file. Loaded graphs are memoized by name, so a copy of the memoized graph is returned
+    """
+    return _load_graph(graph_name).copy()
+
+
+@lru_cache(maxsize=8)
+def _load_graph(graph_name: str) -> MultiDiGraph:
+    """Loads a graph from CFPQ_Data dataset, memoized by name.
+
+    Args:
+        graph_name (str): Name of the graph to be loaded from the dataset.
+
+    Returns:
+        Class loaded from csv file, must not be modified
     """
     path = cfpq_data.download(graph_name)
     return cfpq_data.graph_from_csv(path)
 
 
+def _load_graph_bool_matrix(graph_name: str) -> BooleanMatrix:
+    """Loads a graph from CFPQ_Data dataset as boolean matrices.
+
+    Args:
+        graph_name (str): Name of the graph to be loaded from the dataset.
+
+    Returns:
+        Boolean matrices of graph where each node is start and final state
+    """
+    return _graph_bool_matrix_from_csv(cfpq_data.download(graph_name))
+
+
+def _graph_bool_matrix_from_csv(file: Union[IO, str]) -> BooleanMatrix:
+    """Reads graph edges in CFPQ_Data csv format straight into boolean matrices.
+
+    No MultiDiGraph or NFA is built, edges are grouped by label as index arrays.
+
+    Args:
+        file (Union[IO, str]): path or file where edges are stored
+
+    Returns:
+        Boolean matrices of graph where each node is start and final state
+
+    Raises:
+        ValueError: If some edge misses its source, destination or label
+    """
+    try:
+        edges = pd.read_csv(
+            file, sep=" ", header=None, names=["from", "to", "label"], engine="c"
+        )
+    except pd.errors.EmptyDataError:
+        return BooleanMatrix(
+            state_to_index={},
+            start_states=set(),
+            final_states=set(),
+            bool_matrices=defaultdict(lambda: csr_matrix((0, 0), dtype=bool)),
+        )
+    incomplete = np.flatnonzero(edges.isna().any(axis=1).to_numpy())
+    if len(incomplete):
+        raise ValueError(f"Edge in line {incomplete[0] + 1} misses endpoint or label")
+    nodes, indices = np.unique(
+        np.concatenate([edges["from"].to_numpy(), edges["to"].to_numpy()]),
+        return_inverse=True,
+    )
+    nodes_num = len(nodes)
+    rows, cols = np.split(indices.astype(np.intc), 2)
+    states = set(map(State, nodes.tolist()))
+    bool_matrices = defaultdict(lambda: csr_matrix((nodes_num, nodes_num), dtype=bool))
+    for label, positions in edges.groupby("label", sort=False).indices.items():
+        bool_matrices[label] = coo_matrix(
+            (
+                np.ones(len(positions), dtype=bool),
+                (rows[positions], cols[positions]),
+            ),
+            shape=(nodes_num, nodes_num),
+        ).tocsr()
+    return BooleanMatrix(
+        state_to_index={State(node): idx for idx, node in enumerate(nodes.tolist())},
+        start_states=states,
+        final_states=states.copy(),
+        bool_matrices=bool_matrices,
+    )
+
+
 def save_graph_dot(cur_graph: MultiDiGraph, file: Union[IO, str]) -> None:
     """Saves the given graph in DOT format to file
 
@@ -50,7 +136,7 @@ def save_graph_dot(cur_graph: MultiDiGraph, file: Union[IO, str]) -> None:
     Returns:
         None
     """
-    drawing.nx_pydot.write_dot(cur_graph, file)
+    write_dot(cur_graph, file)
 
 
 def get_graph_info(cur_graph: MultiDiGraph) -> Graph:
@@ -62,11 +148,12 @@ def get_graph_info(cur_graph: MultiDiGraph) -> Graph:
     Returns:
         Class with information about graph
     """
-    return Graph(
-        cur_graph.number_of_nodes(),
-        cur_graph.number_of_edges(),
-        set(label for u, v, label in cur_graph.edges(data="label") if label),
-    )
+    edges, labels = 0, set()
+    for _, _, label in cur_graph.edges(data="label"):
+        edges += 1
+        if label:
+            labels.add(label)
+    return Graph(cur_graph.number_of_nodes(), edges, labels)
 
 
 def get_graph_info_by_name(graph_name: str) -> Graph:
@@ -78,7 +165,7 @@ def get_graph_info_by_name(graph_name: str) -> Graph:
     Returns:
         Class with information about graph
     """
-    return get_graph_info(load_graph(graph_name))
+    return get_graph_info(_load_graph(graph_name))
 
 
 def build_labeled_two_cycles_graph(
@@ -94,7 +181,28 @@ def build_labeled_two_cycles_graph(
         labels (Tuple[str, str]): labels for edges
 
     Returns:
-        Labeled two cycles graph as MultiDiGraph
+        Labeled two cycles graph as MultiDiGraph (a copy of the memoized one)
+    """
+    return _build_labeled_two_cycles_graph(
+        nodes_first_cycle, nodes_second_cycle, tuple(labels)
+    ).copy()
+
+
+@lru_cache(maxsize=32)
+def _build_labeled_two_cycles_graph(
+    nodes_first_cycle: int,
+    nodes_second_cycle: int,
+    labels: Tuple[str, str],
+) -> MultiDiGraph:
+    """Builds labeled graph with two cycles, memoized by arguments.
+
+    Args:
+        nodes_first_cycle (int): number of nodes in first cycle
+        nodes_second_cycle (int): number of nodes in second cycle
+        labels (Tuple[str, str]): labels for edges
+
+    Returns:
+        Labeled two cycles graph as MultiDiGraph, must not be modified
     """
     return cfpq_data.labeled_two_cycles_graph(
         nodes_first_cycle, nodes_second_cycle, labels=labels
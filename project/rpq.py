@@ -1,4 +1,5 @@
 import enum
+import numpy as np
 from networkx import MultiDiGraph
 from pyformlang.regular_expression import Regex
 from typing import Set, Tuple, Any, Union
@@ -37,23 +38,24 @@ def rpq_tensor(
         automata_utils.generate_min_dfa_by_regex(regex=query),
     )
     intersection_bool_mtx = nfa_bool_mtx & query_bool_mtx
-    idx_to_state = {
-        idx: state for state, idx in intersection_bool_mtx.state_to_index.items()
-    }
+    graph_nodes = np.empty(len(nfa_bool_mtx.state_to_index), dtype=object)
+    for state, idx in nfa_bool_mtx.state_to_index.items():
+        graph_nodes[idx] = state.value
+
     transitive_closure = intersection_bool_mtx.get_transitive_closure()
-    result = set()
-    for state_from_idx, state_to_idx in zip(*transitive_closure.nonzero()):
-        state_from, state_to = idx_to_state[state_from_idx], idx_to_state[state_to_idx]
-        if (
-            state_from in intersection_bool_mtx.start_states
-            and state_to in intersection_bool_mtx.final_states
-        ):
-            state_from_graph_value, _ = state_from.value
-            state_to_graph_value, _ = state_to.value
-            result.add(
-                (state_from_graph_value, state_to_graph_value),
-            )
-    return result
+    rows, cols = transitive_closure.nonzero()
+    keep = (
+        intersection_bool_mtx.get_start_mask()[rows]
+        & intersection_bool_mtx.get_final_mask()[cols]
+    )
+    # Intersection state index is graph state index * query states + query state index
+    query_states = len(query_bool_mtx.state_to_index)
+    return set(
+        zip(
+            graph_nodes[rows[keep] // query_states].tolist(),
+            graph_nodes[cols[keep] // query_states].tolist(),
+        )
+    )
 
 
 class RpqMode(enum.Enum):
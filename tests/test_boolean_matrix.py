@@ -6,7 +6,9 @@ from pyformlang.finite_automaton import (
     EpsilonNFA,
     Symbol,
 )
+from scipy.sparse import csr_matrix
 
+from project import generate_min_dfa_by_regex
 from project.boolean_matrix import BooleanMatrix
 from project.ecfg import ECFG
 
@@ -37,24 +39,60 @@ def nfa():
 )
 def test_adjacency(nfa, label, edges):
     bm = BooleanMatrix.from_nfa(nfa)
-    assert all(bm.bool_matrices[label][edge] for edge in edges)
+    idx = bm.state_to_index
+    assert set(zip(*bm.bool_matrices[label].nonzero())) == {
+        (idx[State(i)], idx[State(j)]) for i, j in edges
+    }
 
 
 def test_transitive_closure_empty():
     bm = BooleanMatrix.from_nfa(EpsilonNFA())
     tc = bm.get_transitive_closure()
-    assert not tc.toarray().tolist()
+    assert tc.shape == (0, 0)
 
 
 def test_transitive_closure(nfa):
     bm = BooleanMatrix.from_nfa(nfa)
     tc = bm.get_transitive_closure()
-    assert [
-        [33.0, 84.0, 60.0, 44.0],
-        [44.0, 117.0, 84.0, 60.0],
-        [16.0, 44.0, 33.0, 24.0],
-        [24.0, 60.0, 44.0, 33.0],
-    ] == tc.toarray().tolist()
+    assert tc.shape == (4, 4)
+    assert tc.count_nonzero() == 16
+
+
+@pytest.mark.parametrize("bitset_max_comps", [0, 1 << 12])
+def test_transitive_closure_acyclic(monkeypatch, bitset_max_comps):
+    monkeypatch.setattr(
+        "project.boolean_matrix._BITSET_CLOSURE_MAX_COMPS", bitset_max_comps
+    )
+    nfa = EpsilonNFA()
+    nfa.add_transitions([(0, "a", 1), (1, "b", 2), (3, "a", 3)])
+    bm = BooleanMatrix.from_nfa(nfa)
+    idx = bm.state_to_index
+    expected = {
+        (idx[State(0)], idx[State(1)]),
+        (idx[State(0)], idx[State(2)]),
+        (idx[State(1)], idx[State(2)]),
+        (idx[State(3)], idx[State(3)]),
+    }
+    assert set(zip(*bm.get_transitive_closure().nonzero())) == expected
+
+
+def test_remove_self_loops(nfa):
+    bm = BooleanMatrix.from_nfa(nfa)
+    bm.remove_self_loops()
+    idx = bm.state_to_index
+    assert set(zip(*bm.bool_matrices["b"].nonzero())) == {
+        (idx[State(3)], idx[State(0)])
+    }
+
+
+def test_remove_self_loops_keeps_old_matrices(nfa):
+    bm = BooleanMatrix.from_nfa(nfa)
+    old_matrix = bm.bool_matrices["b"]
+    old_cells = set(zip(*old_matrix.nonzero()))
+    bm.remove_self_loops()
+    assert bm.bool_matrices["b"] is not old_matrix
+    assert old_matrix.nnz == len(old_matrix.indices) == len(old_cells) == 2
+    assert set(zip(*old_matrix.nonzero())) == old_cells
 
 
 @pytest.mark.parametrize(
@@ -130,6 +168,15 @@ def test_intersection(nfa):
     )
 
 
+def test_to_nfa(nfa):
+    nfa.add_start_state(State(0))
+    nfa.add_final_state(State(3))
+    actual = BooleanMatrix.from_nfa(nfa).to_nfa()
+    assert set(actual) == set(nfa)
+    assert actual.start_states == nfa.start_states
+    assert actual.final_states == nfa.final_states
+
+
 @pytest.fixture
 def non_empty_nfa():
     nfa = EpsilonNFA()
@@ -145,33 +192,11 @@ def test_intersection_with_non_empty_automaton_matrix(non_empty_nfa):
     intersection = BooleanMatrix.from_nfa(non_empty_nfa) & BooleanMatrix.from_nfa(
         non_empty_nfa
     )
-    for label, values in intersection.bool_matrices.items():
-        print(label, values.toarray().tolist())
-    assert all(
-        (
-            [
-                [True, False, False, False],
-                [False, False, False, False],
-                [False, False, False, False],
-                [False, False, False, False],
-            ]
-            == intersection.bool_matrices["a"].toarray().tolist(),
-            [
-                [False, False, False, True],
-                [False, False, False, False],
-                [False, False, False, False],
-                [False, False, False, False],
-            ]
-            == intersection.bool_matrices["b"].toarray().tolist(),
-            [
-                [False, False, False, False],
-                [False, False, False, False],
-                [False, False, False, False],
-                [False, False, False, True],
-            ]
-            == intersection.bool_matrices["c"].toarray().tolist(),
-        )
-    )
+    assert all(matrix.shape == (4, 4) for matrix in intersection.bool_matrices.values())
+    assert {
+        label: set(zip(*matrix.nonzero()))
+        for label, matrix in intersection.bool_matrices.items()
+    } == {"a": {(0, 0)}, "b": {(0, 3)}, "c": {(3, 3)}}
 
 
 @pytest.mark.parametrize(
@@ -228,3 +253,66 @@ def test_bool_matrix_from_rsm(text_cfg, expected_start, expected_final, expected
             == expected_b,
         )
     )
+
+
+def test_direct_sum(nfa, non_empty_nfa):
+    first, second = BooleanMatrix.from_nfa(nfa), BooleanMatrix.from_nfa(non_empty_nfa)
+    direct_sum = first._direct_sum(second)
+    first_num = len(first.state_to_index)
+    assert len(direct_sum.state_to_index) == first_num + len(second.state_to_index)
+    assert direct_sum.bool_matrices.keys() == {"a", "b", "c"}
+    for label, matrix in direct_sum.bool_matrices.items():
+        assert set(zip(*matrix.nonzero())) == set(
+            zip(*first.bool_matrices[label].nonzero())
+        ) | {
+            (i + first_num, j + first_num)
+            for i, j in zip(*second.bool_matrices[label].nonzero())
+        }
+
+
+def test_sync_bfs_after_remove_self_loops():
+    graph_nfa = EpsilonNFA()
+    graph_nfa.add_transition(State(0), Symbol("a"), State(0))
+    graph_nfa.add_start_state(State(0))
+    graph_nfa.add_final_state(State(0))
+    graph = BooleanMatrix.from_nfa(graph_nfa)
+    query = BooleanMatrix.from_nfa(generate_min_dfa_by_regex("a"))
+    assert graph.sync_bfs(query, False) == {0}
+
+    graph.remove_self_loops()
+    assert graph.sync_bfs(query, False) == set()
+    assert BooleanMatrix.from_nfa(graph.to_nfa()).sync_bfs(query, False) == set()
+
+
+def test_sync_bfs_after_query_remove_self_loops():
+    graph_nfa = EpsilonNFA()
+    graph_nfa.add_transition(State(0), Symbol("a"), State(1))
+    graph_nfa.add_start_state(State(0))
+    graph_nfa.add_final_state(State(1))
+    graph = BooleanMatrix.from_nfa(graph_nfa)
+    query = BooleanMatrix.from_nfa(generate_min_dfa_by_regex("a*"))
+    assert graph.sync_bfs(query, False) == {1}
+
+    query.remove_self_loops()
+    assert graph.sync_bfs(query, False) == set()
+
+
+def test_sync_bfs_after_bool_matrices_change():
+    graph_nfa = EpsilonNFA()
+    graph_nfa.add_transition(State(0), Symbol("a"), State(1))
+    graph_nfa.add_start_state(State(0))
+    graph_nfa.add_final_state(State(1))
+    graph = BooleanMatrix.from_nfa(graph_nfa)
+    query = BooleanMatrix.from_nfa(generate_min_dfa_by_regex("a"))
+    assert graph.sync_bfs(query, False) == {1}
+
+    graph.bool_matrices["a"] = csr_matrix(graph.bool_matrices["a"].shape, dtype=bool)
+    assert graph.sync_bfs(query, False) == set()
+
+
+def test_start_final_masks(non_empty_nfa):
+    intersection = BooleanMatrix.from_nfa(non_empty_nfa) & BooleanMatrix.from_nfa(
+        non_empty_nfa
+    )
+    assert intersection.get_start_mask().tolist() == [True, False, False, False]
+    assert intersection.get_final_mask().tolist() == [False, False, False, True]
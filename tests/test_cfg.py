@@ -74,3 +74,18 @@ def test_get_cfg_from_file(tmpdir, text_cfg, expected_productions):
 def test_cfg_convert_to_wcnf(text_cfg, expected_productions):
     cfg_wcnf = cfg_to_weak_chomsky_normal_form(CFG.from_text(text_cfg))
     assert cfg_wcnf.productions == expected_productions
+
+
+def test_cfg_convert_to_wcnf_memoized():
+    cfg_wcnf = cfg_to_weak_chomsky_normal_form(CFG.from_text("S -> a S b | epsilon"))
+    same_cfg_wcnf = cfg_to_weak_chomsky_normal_form(
+        CFG.from_text("S -> a S b | epsilon")
+    )
+    assert cfg_wcnf is not same_cfg_wcnf
+    assert cfg_wcnf.start_symbol == same_cfg_wcnf.start_symbol
+    assert cfg_wcnf.productions == same_cfg_wcnf.productions
+    assert cfg_wcnf.productions is not same_cfg_wcnf.productions
+    other_cfg_wcnf = cfg_to_weak_chomsky_normal_form(
+        CFG.from_text("S -> a S b | epsilon", start_symbol=Variable("A"))
+    )
+    assert other_cfg_wcnf.productions != cfg_wcnf.productions
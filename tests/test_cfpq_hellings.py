@@ -1,9 +1,10 @@
 import pytest
 from networkx import MultiDiGraph
-from pyformlang.cfg import CFG
+from pyformlang.cfg import CFG, Variable
 
 from project.graph_utils import *
 from project.cfpq import *
+from project.cfg_utils import get_cfg_from_file
 
 
 @pytest.mark.parametrize(
@@ -44,3 +45,15 @@ from project.cfpq import *
 )
 def test_cfpq(text_cfg, graph, pairs):
     assert cfpq(CFPQAlgorithm.HELLINGS, graph, CFG.from_text(text_cfg)) == pairs
+
+
+def test_cfpq_start_symbol_keeps_grammar(tmpdir):
+    file = tmpdir.mkdir("test_dir").join("cfg_file")
+    file.write("S -> A\nA -> a")
+    graph = build_labeled_two_cycles_graph(1, 1, ("a", "b"))
+    assert cfpq(CFPQAlgorithm.HELLINGS, graph, str(file), start_symbol=Variable("A"))
+    assert get_cfg_from_file(file).start_symbol == Variable("S")
+
+    cfg = CFG.from_text("S -> A\nA -> a")
+    assert cfpq(CFPQAlgorithm.HELLINGS, graph, cfg, start_symbol=Variable("A"))
+    assert cfg.start_symbol == Variable("S")
@@ -1,5 +1,6 @@
 import pytest
 from pyformlang.cfg import Variable
+from pyformlang.finite_automaton import State, Symbol
 
 from project import ecfg_to_rsm, generate_min_dfa_by_regex
 from project.ecfg import *
@@ -57,3 +58,31 @@ def test_ecfg_to_rsm(text_ecfg):
         )
         for v in ecfg.productions
     )
+
+
+def test_ecfg_to_rsm_memoized():
+    first = ECFG.from_text("S -> a S b | c").to_rsm()
+    second = ECFG.from_text("S -> a S b | c").to_rsm()
+    assert first.boxes[Variable("S")] is not second.boxes[Variable("S")]
+    assert check_automatons_equivalent(
+        first.boxes[Variable("S")], second.boxes[Variable("S")]
+    )
+
+
+def test_ecfg_from_text_memoized():
+    first = ECFG.from_text("S -> a S b | c\nA -> a*")
+    second = ECFG.from_text("S -> a S b | c\nA -> a*", start_symbol=Variable("A"))
+    assert second.start_symbol == Variable("A")
+    assert first.productions is not second.productions
+    assert first.variables is not second.variables
+    assert first.productions == second.productions
+    assert first.variables == {Variable("S"), Variable("A")}
+
+
+def test_ecfg_to_rsm_memoized_box_not_shared():
+    first = ECFG.from_text("S -> a S b | c").to_rsm().boxes[Variable("S")]
+    states_num = len(first.states)
+    first.add_transition(State("extra"), Symbol("d"), State("extra"))
+    second = ECFG.from_text("S -> a S b | c").to_rsm().boxes[Variable("S")]
+    assert len(second.states) == states_num
+    assert Symbol("d") not in second.symbols
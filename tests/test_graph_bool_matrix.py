@@ -0,0 +1,47 @@
+import cfpq_data
+import pytest
+
+from project import (
+    BooleanMatrix,
+    build_labeled_two_cycles_graph,
+    graph_to_epsilon_nfa,
+)
+from project.graph_utils import _graph_bool_matrix_from_csv
+
+
+def _labeled_edges(bool_matrix):
+    index_to_state = {i: s for s, i in bool_matrix.state_to_index.items()}
+    return {
+        (index_to_state[i], label, index_to_state[j])
+        for label, mtx in bool_matrix.bool_matrices.items()
+        for i, j in zip(*mtx.nonzero())
+    }
+
+
+def test_graph_bool_matrix_from_csv(tmpdir):
+    path = tmpdir.join("graph.csv")
+    cfpq_data.graph_to_csv(build_labeled_two_cycles_graph(4, 3, ("a", "b")), path)
+    expected = BooleanMatrix.from_nfa(
+        graph_to_epsilon_nfa(cfpq_data.graph_from_csv(path))
+    )
+    actual = _graph_bool_matrix_from_csv(path)
+    assert actual.start_states == expected.start_states
+    assert actual.final_states == expected.final_states
+    assert _labeled_edges(actual) == _labeled_edges(expected)
+
+
+def test_empty_graph_bool_matrix_from_csv(tmpdir):
+    path = tmpdir.join("graph.csv")
+    path.write("")
+    actual = _graph_bool_matrix_from_csv(path)
+    assert not actual.state_to_index
+    assert not actual.start_states and not actual.final_states
+    assert not actual.bool_matrices
+    assert actual.bool_matrices["a"].shape == (0, 0)
+
+
+def test_unlabeled_edge_graph_bool_matrix_from_csv(tmpdir):
+    path = tmpdir.join("graph.csv")
+    path.write("0 1 a\n1 2\n")
+    with pytest.raises(ValueError, match="line 2"):
+        _graph_bool_matrix_from_csv(path)
@@ -1,31 +1,42 @@
 import filecmp
 import os.path
 
-from project import save_graph_dot, load_graph, build_then_save_labeled_two_cycles_graph
+from project import (
+    save_graph_dot,
+    load_graph,
+    build_labeled_two_cycles_graph,
+    build_then_save_labeled_two_cycles_graph,
+    get_graph_info,
+    Graph,
+)
 
 test_dir_path = os.path.dirname(os.path.abspath(__file__))
 
 
-def test_save_graph_dot():
-    actual_file_path = os.sep.join(
-        [test_dir_path, "resources", "actual_graph_save.dot"]
-    )
+def test_save_graph_dot(tmp_path):
+    actual_file_path = tmp_path / "actual_graph_save.dot"
     reference_file_path = os.sep.join(
         [test_dir_path, "resources", "reference_graph_save.dot"]
     )
 
     save_graph_dot(load_graph("wc"), actual_file_path)
     assert filecmp.cmp(actual_file_path, reference_file_path)
-    os.remove(actual_file_path)
 
 
-def test_build_then_save_labeled_two_cycles_graph():
-    actual_file_path = os.sep.join(
-        [test_dir_path, "resources", "actual_labeled_two_cycles_graph.dot"]
-    )
+def test_build_then_save_labeled_two_cycles_graph(tmp_path):
+    actual_file_path = tmp_path / "actual_labeled_two_cycles_graph.dot"
     reference_file_path = os.sep.join(
         [test_dir_path, "resources", "reference_labeled_two_cycles_graph.dot"]
     )
     build_then_save_labeled_two_cycles_graph(21, 22, ("y", "a"), actual_file_path)
     assert filecmp.cmp(actual_file_path, reference_file_path)
-    os.remove(actual_file_path)
+
+
+def test_build_labeled_two_cycles_graph_not_shared():
+    first = build_labeled_two_cycles_graph(2, 3, ("a", "b"))
+    first.add_edge(0, 100, label="c")
+    first.remove_edge(0, 1)
+    second = build_labeled_two_cycles_graph(2, 3, ("a", "b"))
+    assert second is not first
+    assert get_graph_info(second) == Graph(6, 7, {"a", "b"})
+    assert second.has_edge(0, 1)
@@ -78,3 +78,9 @@ def test_regex_to_dfa(regex, accepted, declined) -> None:
 
     assert all(dfa.accepts(word) for word in accepted)
     assert all(not dfa.accepts(word) for word in declined)
+
+
+def test_generate_min_dfa_memoized(min_dfa):
+    dfa = generate_min_dfa_by_regex("a*b*c*")
+    assert dfa is not min_dfa
+    assert check_automatons_equivalent(dfa, min_dfa)
@@ -2,6 +2,7 @@ import pytest
 from networkx import MultiDiGraph
 from pyformlang.regular_expression import PythonRegex
 
+from project.boolean_matrix import BooleanMatrix
 from project.rpq import *
 
 
@@ -70,3 +71,45 @@ def test_by_word_separated():
         RpqMode.FIND_REACHABLE_FOR_EACH_START_NODE,
     )
     assert result == {(0, 3), (6, 9), (3, 6)}
+
+
+def test_by_word_separated_sparse_front(monkeypatch):
+    monkeypatch.setattr("project.boolean_matrix._DENSE_FRONT_MAX_CELLS", 0)
+    test_by_word_separated()
+
+
+@pytest.mark.parametrize("dense_max_cells", [None, 0, 1 << 24])
+def test_many_labels_front_size(monkeypatch, dense_max_cells):
+    fronts = []
+    dense_sync_bfs = BooleanMatrix._dense_sync_bfs
+
+    def record_dense_sync_bfs(front, stacked, other_states_num):
+        fronts.append(front.shape)
+        return dense_sync_bfs(front, stacked, other_states_num)
+
+    monkeypatch.setattr(
+        BooleanMatrix, "_dense_sync_bfs", staticmethod(record_dense_sync_bfs)
+    )
+    graph_by_word = MultiDiGraph()
+    for i, w in enumerate("abcdefgh" * 2):
+        graph_by_word.add_edge(i, i + 1, label=w)
+
+    def run_query():
+        return rpq_bfs(
+            graph_by_word,
+            "abcdefgh",
+            RpqMode.FIND_REACHABLE_FOR_EACH_START_NODE,
+        )
+
+    if dense_max_cells is None:
+        # Front fits the limit by itself, but its products with 8 labels do not
+        assert run_query() == {(0, 8), (8, 16)}
+        (front_shape,) = fronts
+        fronts.clear()
+        dense_max_cells = front_shape[0] * front_shape[1]
+    monkeypatch.setattr(
+        "project.boolean_matrix._DENSE_FRONT_MAX_CELLS", dense_max_cells
+    )
+
+    assert run_query() == {(0, 8), (8, 16)}
+    assert bool(fronts) == (dense_max_cells == 1 << 24)
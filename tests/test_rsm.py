@@ -1,4 +1,5 @@
 import pytest
+from pyformlang.cfg import CFG
 
 from project.ecfg import *
 from project.cfg_utils import *
@@ -28,3 +29,30 @@ def test_minimize_rsm(text_ecfg):
         )
         for automaton in minimize_rsm(rsm).boxes.values()
     )
+
+
+@pytest.mark.parametrize(
+    "text_cfg",
+    [
+        "",
+        "S -> ",
+        "S -> a S b | a b | epsilon",
+        """
+        S -> A B | a
+        A -> a A | a B | b
+        B -> b | epsilon
+        """,
+    ],
+)
+def test_cfg_to_rsm(text_cfg):
+    cfg = CFG.from_text(text_cfg)
+    rsm = cfg_to_rsm(cfg)
+    expected_rsm = ECFG.from_cfg(cfg).to_rsm()
+    assert rsm.start_symbol == expected_rsm.start_symbol
+    assert rsm.boxes.keys() == expected_rsm.boxes.keys()
+    assert all(
+        check_automatons_equivalent(
+            rsm.boxes[v].minimize(), expected_rsm.boxes[v].minimize()
+        )
+        for v in rsm.boxes
+    )
@@ -17,12 +17,54 @@ def check_automatons_equivalent(first_automaton, second_automaton) -> bool:
     Returns:
         True if automatons are equivalent, otherwise False
     """
+    first_canonical = _get_canonical_form(first_automaton)
+    second_canonical = _get_canonical_form(second_automaton)
+    if first_canonical is not None and second_canonical is not None:
+        return first_canonical == second_canonical
     return _check_graphs_isomorphic(
         _convert_automaton_to_graph(first_automaton),
         _convert_automaton_to_graph(second_automaton),
     )
 
 
+def _get_canonical_form(automaton):
+    # Deterministic automaton with all states reachable from the start has unique
+    # BFS numbering, so isomorphic ones get equal forms. None means fallback needed
+    if len(automaton.start_states) != 1:
+        return None
+    transitions = {}
+    for state_from, symbol, state_to in automaton:
+        state_transitions = transitions.setdefault(state_from, {})
+        if symbol.value in state_transitions:
+            return None
+        state_transitions[symbol.value] = state_to
+        transitions.setdefault(state_to, {})
+
+    start_state = next(iter(automaton.start_states))
+    if start_state not in transitions:
+        return None
+    indices = {start_state: 0}
+    queue = [start_state]
+    canonical_transitions = []
+    for state_from in queue:
+        for value, state_to in sorted(
+            transitions[state_from].items(), key=lambda item: repr(item[0])
+        ):
+            if state_to not in indices:
+                indices[state_to] = len(indices)
+                queue.append(state_to)
+            canonical_transitions.append(
+                (indices[state_from], value, indices[state_to])
+            )
+    if len(indices) != len(transitions):
+        return None
+
+    final_indices = {
+        index for state, index in indices.items() if state in automaton.final_states
+    }
+    return canonical_transitions, final_indices
+
+
 def _check_graphs_isomorphic(first_graph, second_graph):
     return is_isomorphic(
         first_graph,